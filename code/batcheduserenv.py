@@ -0,0 +1,301 @@
+from typing import List
+
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+from user import UserProperties
+from task import Task, TaskPropertiesDistribution, TaskPropertiesQueue, AntiCheatSettings
+from userenv import UserModelEnv
+from util.exputil import Config
+
+
+class BatchedUserModelEnv(VecEnv):
+    """
+    A batch of crowdworking platforms as one vectorized RL environment. It behaves like num_envs independent
+    UserModelEnv environments, but the state of all of them is stored in numpy arrays of shape (num_envs,)
+    or (num_envs, num_tasks) and each step is computed with vector operations for the whole batch.
+    Like the other vectorized environments of stable-baselines3, episodes that have ended are reset automatically.
+    """
+
+    def __init__(self, num_envs: int, config: Config, user_properties: UserProperties,
+                 tasks_properties_distributions: List[TaskPropertiesDistribution],
+                 anti_cheat_settings: AntiCheatSettings):
+        """
+        :param num_envs: number of environments in the batch
+        :param config: experimental configuration
+        :param user_properties: properties of the worker
+        :param tasks_properties_distributions: list of task-givers, decide/generate the properties of the tasks,
+                one for each task in each episode
+        :param anti_cheat_settings: settings to deter cheating
+        """
+        self.config: Config = config
+
+        self.num_tasks: int = len(tasks_properties_distributions)
+        self.num_actions = 3 + self.num_tasks
+        self.render_mode = None
+        action_space, observation_space = UserModelEnv.create_spaces(self.num_tasks)
+        super().__init__(num_envs, observation_space, action_space)
+
+        self.user_properties: UserProperties = user_properties
+        self.tasks_properties_distributions: List[TaskPropertiesDistribution] = tasks_properties_distributions
+        self.anti_cheat_settings: AntiCheatSettings = anti_cheat_settings
+
+        # index of each environment in the batch, used to pick one task per environment
+        self.env_indices = np.arange(num_envs)
+
+        # state of the worker in each environment
+        self.user_reputation = np.full(num_envs, user_properties.start_reputation, dtype=np.float64)
+        self.overall_time_spent = np.zeros(num_envs, dtype=np.float64)
+        self.current_task_idx = np.full(num_envs, -1, dtype=np.int64) # last task that was selected by agent
+
+        # properties of the tasks in each environment (see TaskProperties)
+        shape = (num_envs, self.num_tasks)
+        self.task_payout = np.zeros(shape, dtype=np.float64)
+        self.task_expertise = np.zeros(shape, dtype=np.float64)
+        self.task_effort = np.zeros(shape, dtype=np.float64)
+        self.task_interestingness = np.zeros(shape, dtype=np.float64)
+        self.task_target_num_instances = np.zeros(shape, dtype=np.float64)
+        self.task_num_classes = np.ones(shape, dtype=np.int64)
+
+        # state of the tasks in each environment (see Task)
+        self.task_mode = np.full(shape, Task.LABEL_MODE, dtype=np.int64)
+        self.task_true_label = np.zeros(shape, dtype=np.int64) # true label of the current question
+        self.task_instance_counter = np.zeros(shape, dtype=np.int64)
+        self.task_real_instance_counter = np.zeros(shape, dtype=np.int64)
+        self.task_qa_false_counter = np.zeros(shape, dtype=np.int64)
+        # whether each task is still active, see update_task_active(). Only recomputed (in place) when the counters of
+        # a task or the reputation change
+        self.task_active = np.zeros(shape, dtype=np.bool_)
+        self.task_active_buffer = np.zeros(shape, dtype=np.bool_)
+
+        # mapping from task to task-giver/properties-distribution, see UserModelEnv
+        self.task_task_dist_map = np.zeros(shape, dtype=np.int64)
+
+        self.actions: np.ndarray = np.zeros(num_envs, dtype=np.int64)
+        self.random = None
+        # properties of the tasks for the next episodes, drawn in advance from the task-givers
+        self.task_properties_queue = TaskPropertiesQueue()
+
+    def reset(self):
+        """
+        Reset all environments for a new episode
+        """
+        self.reset_envs(self.env_indices)
+        return self.create_observation()
+
+    def reset_envs(self, env_indices: np.ndarray):
+        """
+        Reset the given environments for a new episode
+        """
+        for env_index in env_indices:
+            task_props = self.task_properties_queue.next(self.tasks_properties_distributions, self.random)
+            # shuffle tasks, so that even if the task property distributions are different, it can not learn which
+            # is which but store mapping so that we can recover the creating task distribution
+            task_dist_indices = self.random.permutation(self.num_tasks)
+            for task_index, task_dist_index in enumerate(task_dist_indices):
+                props = task_props[task_dist_index]
+                self.task_payout[env_index, task_index] = props.payout
+                self.task_expertise[env_index, task_index] = props.expertise
+                self.task_effort[env_index, task_index] = props.effort
+                self.task_interestingness[env_index, task_index] = props.interestingness
+                self.task_target_num_instances[env_index, task_index] = props.target_num_instances
+                self.task_num_classes[env_index, task_index] = props.num_classes
+            self.task_task_dist_map[env_index] = task_dist_indices
+
+        self.task_mode[env_indices] = Task.LABEL_MODE
+        self.task_true_label[env_indices] = 0
+        self.task_instance_counter[env_indices] = 0
+        self.task_real_instance_counter[env_indices] = 0
+        self.task_qa_false_counter[env_indices] = 0
+
+        self.current_task_idx[env_indices] = -1
+        self.overall_time_spent[env_indices] = 0
+        self.user_reputation[env_indices] = self.user_properties.start_reputation
+        self.update_task_active()
+
+    def step_async(self, actions: np.ndarray):
+        self.actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        """ environments react to the user's actions, same behavior as UserModelEnv.step() but for the whole batch
+        """
+        actions = self.actions
+        user_props = self.user_properties
+        env_indices = self.env_indices
+        rewards = np.zeros(self.num_envs, dtype=np.float64)
+
+        # worker quits -> end of episode
+        quit_mask = actions == UserModelEnv.ACTION_QUIT
+        # reward for using time for something else
+        rewards[quit_mask] = (user_props.time_budget - self.overall_time_spent[quit_mask]) * user_props.time_sensitivity
+
+        # worker runs out of time -> end of episode
+        out_of_time_mask = ~quit_mask & (self.overall_time_spent > user_props.time_budget)
+        done_mask = quit_mask | out_of_time_mask
+
+        # the current task of each environment, environments without a selected task point to task 0,
+        # which is ignored via has_task_mask
+        has_task_mask = self.current_task_idx != -1
+        current_task = np.where(has_task_mask, self.current_task_idx, 0)
+        current_active = has_task_mask & self.task_active[env_indices, current_task]
+
+        # no task selected or task is not active, so answering does not make sense
+        ans_mask = ~done_mask & ((actions == UserModelEnv.ACTION_ANS_RND) | (actions == UserModelEnv.ACTION_ANS_INTENT))
+        invalid_ans_mask = ans_mask & ~current_active
+        rewards[invalid_ans_mask] = -1
+        self.overall_time_spent[invalid_ans_mask] += user_props.random_answer_time
+
+        # negligent and diligent answers
+        rnd_mask = ans_mask & current_active & (actions == UserModelEnv.ACTION_ANS_RND)
+        intent_mask = ans_mask & current_active & (actions == UserModelEnv.ACTION_ANS_INTENT)
+        answered_mask = rnd_mask | intent_mask
+
+        payout = self.task_payout[env_indices, current_task]
+        expertise = self.task_expertise[env_indices, current_task]
+        effort = self.task_effort[env_indices, current_task]
+        interestingness = self.task_interestingness[env_indices, current_task]
+        mode = self.task_mode[env_indices, current_task]
+        true_label = self.task_true_label[env_indices, current_task]
+
+        # all random values of this step, drawn with one call (answer known with expertise, negligent answer,
+        # hidden gold question, true label of the new question), like in UserModelEnv.step()
+        random_values = self.random.random((4, self.num_envs))
+        random_answer = self.random_labels(random_values[1], self.task_num_classes[env_indices, current_task])
+        knows_answer = random_values[0] < expertise
+        answer_to_task = np.where(intent_mask & knows_answer, true_label, random_answer)
+
+        rewards[answered_mask] = user_props.payout_sensitivity * payout[answered_mask]  # monetary reward
+        rewards[intent_mask] += user_props.interestingness_sensitivity * interestingness[intent_mask]
+        self.overall_time_spent[rnd_mask] += user_props.random_answer_time
+        self.overall_time_spent[intent_mask] += user_props.intentional_answer_time * effort[intent_mask]
+
+        # Behavior of the task and task-giver
+        self.task_instance_counter[env_indices[answered_mask], current_task[answered_mask]] += 1
+        qa_mask = answered_mask & (mode == Task.QUALITY_CONTROL_MODE)
+        qa_incorrect_mask = qa_mask & (answer_to_task != true_label)
+        self.task_qa_false_counter[env_indices[qa_incorrect_mask], current_task[qa_incorrect_mask]] += 1
+        label_mask = answered_mask & (mode == Task.LABEL_MODE)
+        self.task_real_instance_counter[env_indices[label_mask], current_task[label_mask]] += 1
+
+        self.user_reputation[qa_incorrect_mask] += self.anti_cheat_settings.reputation_punishment
+        self.user_reputation[qa_mask & ~qa_incorrect_mask] += self.anti_cheat_settings.reputation_bonus
+        np.clip(self.user_reputation, 0.0, 1.0, out=self.user_reputation)
+
+        # task-giver bans worker or has run out of questions, no longer supplies user with new questions
+        self.update_task_active()
+        still_active_mask = answered_mask & self.task_active[env_indices, current_task]
+        self.current_task_idx[answered_mask & ~still_active_mask] = -1
+
+        # select new task
+        switch_mask = ~done_mask & (actions >= UserModelEnv.SWITCH_TASK0)
+        selected_task = np.where(switch_mask, actions - UserModelEnv.SWITCH_TASK0, 0)
+        self.overall_time_spent[switch_mask] += user_props.switch_task_time
+
+        # invalid action, can not select a task that is inactive
+        selected_active = self.task_active[env_indices, selected_task]
+        invalid_switch_mask = switch_mask & ~selected_active
+        rewards[invalid_switch_mask] = -1
+        self.current_task_idx[invalid_switch_mask] = -1
+
+        # we are already in this task, switching does not make sense
+        valid_switch_mask = switch_mask & selected_active
+        rewards[valid_switch_mask & (self.current_task_idx == selected_task)] = -1
+        self.current_task_idx[valid_switch_mask] = selected_task[valid_switch_mask]
+
+        self.give_new_instances(still_active_mask | valid_switch_mask, random_values[2], random_values[3])
+
+        obs = self.create_observation()
+        infos = [{} for _ in range(self.num_envs)]
+        done_indices = env_indices[done_mask]
+        for env_index in done_indices:
+            infos[env_index]["end_reason"] = "user_quit" if quit_mask[env_index] else "end_of_user_time_budget"
+            infos[env_index]["terminal_observation"] = obs[env_index].copy()
+        if len(done_indices) > 0:
+            self.reset_envs(done_indices)
+            obs = self.create_observation()
+
+        return obs, rewards, done_mask, infos
+
+    def give_new_instances(self, mask: np.ndarray, random_qa: np.ndarray, random_label: np.ndarray):
+        """
+        Like envcheck.give_new_question(), new questions for the current task of the environments selected by the mask.
+        random_qa and random_label are uniform random values from [0,1), one per environment.
+        """
+        env_indices = self.env_indices[mask]
+        task_indices = self.current_task_idx[mask]
+        qa_mode = random_qa[mask] < self.anti_cheat_settings.qa_mode_prob
+        self.task_mode[env_indices, task_indices] = np.where(qa_mode, Task.QUALITY_CONTROL_MODE, Task.LABEL_MODE)
+        self.task_true_label[env_indices, task_indices] = self.random_labels(
+            random_label[mask], self.task_num_classes[env_indices, task_indices])
+
+    @staticmethod
+    def random_labels(random_values: np.ndarray, num_classes: np.ndarray):
+        """
+        Maps uniform random values from [0,1) to labels in [0, num_classes)
+        """
+        return np.minimum((random_values * num_classes).astype(np.int64), num_classes - 1)
+
+    def update_task_active(self):
+        """
+        Like envcheck.is_task_active(), whether each task of each environment is still active. The result is written
+        into task_active (shape (num_envs, num_tasks)) without allocating new arrays.
+        """
+        np.less(self.task_real_instance_counter, self.task_target_num_instances, out=self.task_active)
+        np.less(self.task_qa_false_counter, self.anti_cheat_settings.qa_false_max, out=self.task_active_buffer)
+        self.task_active &= self.task_active_buffer
+        self.task_active &= (self.user_reputation >= self.anti_cheat_settings.min_reputation)[:, np.newaxis]
+
+    def create_observation(self):
+        """
+        the part of the environments visible to the worker, same layout as in UserModelEnv, shape
+        (num_envs, observation size)
+        """
+        num_task_values = self.num_tasks * 5
+        obs = np.empty((self.num_envs, num_task_values + 4), dtype=np.float32)
+        # payout for the task
+        obs[:, 0:num_task_values:5] = self.task_payout
+        # how many rounds of labeling already done for the tasks or -1 if task is inactive
+        obs[:, 1:num_task_values:5] = np.where(self.task_active, self.task_instance_counter, -1)
+        # expertise, effort, interestingness (-1 if not at least one instance has been done, i.e. the worker
+        # has tried out the task)
+        tried_mask = self.task_instance_counter > 0
+        obs[:, 2:num_task_values:5] = np.where(tried_mask, self.task_expertise, -1)
+        obs[:, 3:num_task_values:5] = np.where(tried_mask, self.task_effort, -1)
+        obs[:, 4:num_task_values:5] = np.where(tried_mask, self.task_interestingness, -1)
+        # current task idx, user reputation, user time budget, overall time spent
+        obs[:, -4] = self.current_task_idx
+        obs[:, -3] = self.user_reputation
+        obs[:, -2] = self.user_properties.time_budget
+        obs[:, -1] = self.overall_time_spent
+        return obs
+
+    def seed(self, seed=None):
+        """
+        Set the random seed for reproducibility of the environments
+        """
+        self.random = np.random.default_rng(seed)
+        self.task_properties_queue.clear()
+        self.action_space.seed(seed)
+        return [seed] * self.num_envs
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name, indices=None):
+        # all environments of the batch share this object
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        # all environments of the batch share this object, so the attribute can only be set for all of them
+        if len(set(self._get_indices(indices))) != self.num_envs:
+            raise ValueError("BatchedUserModelEnv can only set attributes for all environments of the batch")
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        # all environments of the batch share this object, so the method is only called once (e.g. reset() or seed()
+        # would otherwise be repeated for the whole batch for each index)
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
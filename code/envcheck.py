@@ -0,0 +1,218 @@
+import copy
+from typing import List
+
+import numpy as np
+
+from batcheduserenv import BatchedUserModelEnv
+from task import Task, TaskPropertiesDistribution, AntiCheatSettings
+from user import UserProperties
+from userenv import UserModelEnv
+from util.exputil import Config
+
+
+class ReferenceState:
+    """
+    The state of one crowdworking platform as plain Python values, copied from UserModelEnv or from one environment
+    of BatchedUserModelEnv. Used by the plain Python reference of the rules of the platform below.
+    """
+
+    TASK_ARRAYS = ("payout", "expertise", "effort", "interestingness", "target_num_instances", "num_classes", "mode",
+                   "true_label", "instance_counter", "real_instance_counter", "qa_false_counter")
+
+    def __init__(self, env, env_index=None):
+        """
+        :param env: UserModelEnv or BatchedUserModelEnv
+        :param env_index: index of the environment in the batch of a BatchedUserModelEnv, None for a UserModelEnv
+        """
+        index = Ellipsis if env_index is None else env_index
+        for name in ReferenceState.TASK_ARRAYS:
+            setattr(self, name, getattr(env, "task_" + name)[index].tolist())
+        self.current_task_idx = int(np.asarray(env.current_task_idx)[index])
+        self.user_reputation = float(np.asarray(env.user_reputation)[index])
+        self.overall_time_spent = float(np.asarray(env.overall_time_spent)[index])
+
+
+def is_task_active(state: ReferenceState, task_idx: int, anti_cheat_settings: AntiCheatSettings):
+    """ Whether the task-giver still supplies the worker with new questions """
+    return state.real_instance_counter[task_idx] < state.target_num_instances[task_idx] and \
+           state.qa_false_counter[task_idx] < anti_cheat_settings.qa_false_max and \
+           state.user_reputation >= anti_cheat_settings.min_reputation
+
+
+def give_new_question(state: ReferenceState, task_idx: int, random_values, anti_cheat_settings: AntiCheatSettings):
+    """ The task-giver supplies a new question, either a hidden gold question or an actual question to label """
+    if random_values[2] < anti_cheat_settings.qa_mode_prob:
+        state.mode[task_idx] = Task.QUALITY_CONTROL_MODE
+    else:
+        state.mode[task_idx] = Task.LABEL_MODE
+    num_classes = state.num_classes[task_idx]
+    state.true_label[task_idx] = min(int(random_values[3] * num_classes), num_classes - 1)
+
+
+def reference_step(state: ReferenceState, action: int, random_values, user_properties: UserProperties,
+                   anti_cheat_settings: AntiCheatSettings):
+    """
+    Plain Python reference of UserModelEnv.step(), changes the state in-place. random_values are the four uniform
+    random values of the step (see _step_core in userenv.py).
+    Returns the reward and the end reason of the episode (None if the episode continues).
+    """
+    # worker quits -> end of episode
+    if action == UserModelEnv.ACTION_QUIT:
+        # reward for using time for something else
+        return (user_properties.time_budget - state.overall_time_spent) * user_properties.time_sensitivity, \
+               "user_quit"
+
+    # worker runs out of time -> end of episode
+    if state.overall_time_spent > user_properties.time_budget:
+        return 0, "end_of_user_time_budget"
+
+    task_idx = state.current_task_idx
+
+    if action == UserModelEnv.ACTION_ANS_RND or action == UserModelEnv.ACTION_ANS_INTENT:
+        # no task selected or task is not active, so answering does not make sense
+        if task_idx == -1 or not is_task_active(state, task_idx, anti_cheat_settings):
+            state.overall_time_spent += user_properties.random_answer_time
+            return -1, None
+
+        num_classes = state.num_classes[task_idx]
+        random_answer = min(int(random_values[1] * num_classes), num_classes - 1)
+        reward = user_properties.payout_sensitivity * state.payout[task_idx]
+
+        # negligent answer
+        if action == UserModelEnv.ACTION_ANS_RND:
+            time_spent = user_properties.random_answer_time
+            answer_to_task = random_answer
+
+        # diligent answer
+        else:
+            time_spent = user_properties.intentional_answer_time * state.effort[task_idx]
+            if random_values[0] < state.expertise[task_idx]:
+                answer_to_task = state.true_label[task_idx]
+            else:
+                answer_to_task = random_answer
+            reward += user_properties.interestingness_sensitivity * state.interestingness[task_idx]
+
+        state.overall_time_spent += time_spent
+
+        # Behavior of the task and task-giver
+        state.instance_counter[task_idx] += 1
+        if state.mode[task_idx] == Task.QUALITY_CONTROL_MODE:
+            if answer_to_task != state.true_label[task_idx]:
+                state.qa_false_counter[task_idx] += 1
+                state.user_reputation += anti_cheat_settings.reputation_punishment
+            else:
+                state.user_reputation += anti_cheat_settings.reputation_bonus
+        else:
+            state.real_instance_counter[task_idx] += 1
+        state.user_reputation = max(0, min(1, state.user_reputation))
+
+        # task-giver bans worker or has run out of questions, no longer supplies user with new questions
+        if not is_task_active(state, task_idx, anti_cheat_settings):
+            state.current_task_idx = -1
+        else:
+            give_new_question(state, task_idx, random_values, anti_cheat_settings)
+        return reward, None
+
+    # select new task
+    state.current_task_idx = action - UserModelEnv.SWITCH_TASK0
+    state.overall_time_spent += user_properties.switch_task_time
+
+    # invalid action, can not select a task that is inactive
+    if not is_task_active(state, state.current_task_idx, anti_cheat_settings):
+        state.current_task_idx = -1
+        return -1, None
+
+    give_new_question(state, state.current_task_idx, random_values, anti_cheat_settings)
+    # we are already in this task, switching does not make sense
+    return (-1 if task_idx == state.current_task_idx else 0), None
+
+
+def reference_observation(state: ReferenceState, user_properties: UserProperties,
+                          anti_cheat_settings: AntiCheatSettings):
+    """ Plain Python reference of UserModelEnv.create_observation() """
+    obs = []
+    for i in range(len(state.payout)):
+        obs.append(state.payout[i])
+        obs.append(state.instance_counter[i] if is_task_active(state, i, anti_cheat_settings) else -1)
+        if state.instance_counter[i] > 0:
+            obs.extend([state.expertise[i], state.effort[i], state.interestingness[i]])
+        else:
+            obs.extend([-1, -1, -1])
+    obs.extend([state.current_task_idx, state.user_reputation, user_properties.time_budget, state.overall_time_spent])
+    return np.array(obs, dtype=np.float32)
+
+
+def _check_result(state, action, random_values, env, reward, end_reason, obs):
+    """ Compares the result of one step of an environment with the reference """
+    expected_reward, expected_end_reason = reference_step(state, action, random_values, env.user_properties,
+                                                          env.anti_cheat_settings)
+    assert end_reason == expected_end_reason, \
+        f"Action {UserModelEnv.action_to_str(action)}: end reason {end_reason} instead of {expected_end_reason}"
+    assert np.isclose(reward, expected_reward), \
+        f"Action {UserModelEnv.action_to_str(action)}: reward {reward} instead of {expected_reward}"
+    expected_obs = reference_observation(state, env.user_properties, env.anti_cheat_settings)
+    assert np.allclose(obs, expected_obs), \
+        f"Action {UserModelEnv.action_to_str(action)}: observation\n{obs}\ninstead of\n{expected_obs}"
+
+
+def _check_state(state, env, env_index, action):
+    """ Compares the state of an environment after a step with the state of the reference """
+    env_state = ReferenceState(env, env_index)
+    for name, expected_value in vars(state).items():
+        value = getattr(env_state, name)
+        assert np.allclose(value, expected_value), \
+            f"Action {UserModelEnv.action_to_str(action)}: {name} {value} instead of {expected_value}"
+
+
+def check_user_model_env(env: UserModelEnv, num_steps: int, random: np.random.Generator):
+    """ Takes num_steps random actions in the (seeded) environment and compares each step with the reference """
+    env.reset()
+    for _ in range(num_steps):
+        action = int(random.integers(env.num_actions))
+        state = ReferenceState(env)
+        obs, reward, terminated, truncated, info = env.step(action)
+        # the random values that were used in the step
+        random_values = env.random_values[env.random_values_idx - 1]
+        _check_result(state, action, random_values, env, reward, info.get("end_reason"), obs)
+        _check_state(state, env, None, action)
+        if terminated or truncated:
+            env.reset()
+
+
+def check_batched_user_model_env(env: BatchedUserModelEnv, num_steps: int, random: np.random.Generator):
+    """ Takes num_steps random actions in each environment of the (seeded) batch and compares each step of each
+        environment with the reference
+    """
+    env.reset()
+    for _ in range(num_steps):
+        actions = random.integers(env.num_actions, size=env.num_envs)
+        states = [ReferenceState(env, env_index) for env_index in range(env.num_envs)]
+        # the random values of the step are the first values that the environment draws in step_wait()
+        random_values = copy.deepcopy(env.random).random((4, env.num_envs))
+        obs, rewards, dones, infos = env.step(actions)
+        for env_index in range(env.num_envs):
+            env_obs = infos[env_index]["terminal_observation"] if dones[env_index] else obs[env_index]
+            _check_result(states[env_index], int(actions[env_index]), random_values[:, env_index], env,
+                          rewards[env_index], infos[env_index].get("end_reason"), env_obs)
+            # environments that have ended were already reset
+            if not dones[env_index]:
+                _check_state(states[env_index], env, env_index, int(actions[env_index]))
+
+
+def check_env_rules(config: Config, user_properties: UserProperties,
+                    tasks_properties_distributions: List[TaskPropertiesDistribution],
+                    anti_cheat_settings: AntiCheatSettings, num_steps: int = 10000, num_envs: int = 8):
+    """
+    Checks that UserModelEnv and BatchedUserModelEnv follow the rules of the crowdworking platform as given by the
+    plain Python reference above. Raises an AssertionError at the first step that differs.
+    """
+    random = np.random.default_rng(config.main_seed)
+
+    env = UserModelEnv(config, user_properties, tasks_properties_distributions, anti_cheat_settings)
+    env.seed(config.main_seed)
+    check_user_model_env(env, num_steps, random)
+
+    batched_env = BatchedUserModelEnv(num_envs, config, user_properties, tasks_properties_distributions,
+                                      anti_cheat_settings)
+    batched_env.seed(config.main_seed)
+    check_batched_user_model_env(batched_env, num_steps // num_envs, random)
@@ -4,34 +4,106 @@ import os
 import stable_baselines3
 import sb3_contrib
 from stable_baselines3.common.env_checker import check_env
+from stable_baselines3.common.monitor import ResultsWriter
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecMonitor
 
 from userenv import UserModelEnv
+from batcheduserenv import BatchedUserModelEnv
+from envcheck import check_env_rules
+
+
+class BufferedResultsWriter(ResultsWriter):
+    """ Writes the monitor CSV file like ResultsWriter, but only flushes it every flush_interval episodes instead of
+        after each episode. The remaining rows are flushed when the file is closed.
+    """
+
+    def __init__(self, *args, flush_interval=100, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.flush_interval = flush_interval
+        self.num_unflushed_rows = 0
+
+    def write_row(self, epinfo):
+        if self.logger:
+            self.logger.writerow(epinfo)
+            self.num_unflushed_rows += 1
+            if self.num_unflushed_rows >= self.flush_interval:
+                self.file_handler.flush()
+                self.num_unflushed_rows = 0
+
+
+class BufferedVecMonitor(VecMonitor):
+    """ VecMonitor that writes its episode statistics with a BufferedResultsWriter
+    """
+
+    def __init__(self, venv, filename, flush_interval=100):
+        super().__init__(venv)
+        env_id = None
+        if hasattr(venv, "spec") and venv.spec is not None:
+            env_id = venv.spec.id
+        self.results_writer = BufferedResultsWriter(filename, header={"t_start": self.t_start, "env_id": env_id},
+                                                    flush_interval=flush_interval)
+
+
+def make_env_fn(config, user_props, task_prop_distributions, anti_cheat_settings, seed):
+    """ Returns a function that creates a seeded environment, as needed by the vectorized environments of SB3
+    """
+    def _init():
+        env = UserModelEnv(config, user_props, task_prop_distributions, anti_cheat_settings)
+        env.seed(seed)
+        return env
+    return _init
+
 
 def rl_training(config, user_props, task_prop_distributions, anti_cheat_settings):
-    env = UserModelEnv(config, user_props, task_prop_distributions, anti_cheat_settings)
-    env.seed(config.main_seed)
+    if config.check_env:
+        env = UserModelEnv(config, user_props, task_prop_distributions, anti_cheat_settings)
+        env.seed(config.main_seed)
+        check_env(env, warn=True)
+        check_env_rules(config, user_props, task_prop_distributions, anti_cheat_settings)
 
-    monitored_env = stable_baselines3.common.monitor.Monitor(env, filename=os.path.join(config.exp_dir_path, "train"))
+    # collect experience from several environments in parallel
+    if config.batched_env:
+        vec_env = BatchedUserModelEnv(config.num_envs, config, user_props, task_prop_distributions, anti_cheat_settings)
+        vec_env.seed(config.main_seed)
+    else:
+        # each environment with its own seed
+        env_fns = [make_env_fn(config, user_props, task_prop_distributions, anti_cheat_settings, config.main_seed + i)
+                   for i in range(config.num_envs)]
+        # a single environment is cheap enough to run in the main process
+        if config.num_envs == 1:
+            vec_env = DummyVecEnv(env_fns)
+        else:
+            vec_env = SubprocVecEnv(env_fns)
+    monitored_env = BufferedVecMonitor(vec_env, filename=os.path.join(config.exp_dir_path, "train"))
 
-    check_env(env, warn=True)
+    # train_freq counts the steps of the vectorized environment, each of which collects num_envs transitions, so
+    # the number of gradient steps is scaled to keep the same number of updates per collected transition
+    gradient_steps = config.gradient_steps * config.num_envs
     if config.rl_model == "DQN":
         model = stable_baselines3.DQN("MlpPolicy", monitored_env, seed=config.main_seed, exploration_fraction=config.exploration_fraction,
                                   exploration_initial_eps=1, exploration_final_eps=config.exploration_final_eps,
-                                  learning_starts=config.learning_starts)
+                                  learning_starts=config.learning_starts,
+                                  batch_size=config.batch_size, train_freq=(config.train_freq, "step"),
+                                  gradient_steps=gradient_steps, buffer_size=config.buffer_size)
     elif config.rl_model == "QR-DQN":
         model = sb3_contrib.qrdqn.QRDQN("MlpPolicy", monitored_env, seed=config.main_seed,
                                       exploration_fraction=config.exploration_fraction,
                                       exploration_initial_eps=1, exploration_final_eps=config.exploration_final_eps,
-                                      learning_starts=config.learning_starts)
+                                      learning_starts=config.learning_starts,
+                                      batch_size=config.batch_size, train_freq=(config.train_freq, "step"),
+                                      gradient_steps=gradient_steps, buffer_size=config.buffer_size)
 
     model.set_logger(stable_baselines3.common.logger.configure(config.exp_dir_path, ["stdout", "csv"]))
 
-    start_time = time.time()
-    model.learn(total_timesteps=config.total_timesteps, log_interval=1000)
-    duration = time.time() - start_time
-    print(f"Training took {duration} seconds.")
-
-    model.save(os.path.join(config.exp_dir_path, "model.save"))
+    # the monitor file is only flushed every few episodes, close it also if the training fails
+    try:
+        start_time = time.time()
+        model.learn(total_timesteps=config.total_timesteps, log_interval=1000)
+        duration = time.time() - start_time
+        print(f"Training took {duration} seconds.")
 
+        model.save(os.path.join(config.exp_dir_path, "model.save"))
+    finally:
+        monitored_env.close()
 
 
@@ -1,30 +1,37 @@
-import json
 import pickle
-from typing import Optional
 
 import numpy as np
 
-
-class Instance:
-    """
-    A question, e.g. an image instance in a machine learning labeling task
-    """
-
-    def __init__(self, true_label):
-        self.true_label = true_label
-        self.label = None # label assigned by worker
+from util.exputil import save_json, load_json
 
 
 class TaskPropertiesDistribution:
     """
     TaskPropertiesDistribution represents a task-giver that provides the properties of a  task
     (with create_properties()) in each episode. The child methods define the actual properties.
+    Task-givers with DRAWS_IN_BULK draw the properties for many episodes at once (see TaskPropertiesQueue), so they
+    should not depend on the number of calls. Changing their attributes (e.g. payout) discards the drawn properties.
     """
 
+    # whether create_properties_list() draws the properties of many tasks at once, then the environments draw the
+    # properties for many episodes in advance. Otherwise create_properties() is called in each episode.
+    DRAWS_IN_BULK = False
+
     def create_properties(self, random):
         """ Overwritten by child class """
         pass
 
+    def create_properties_list(self, random, n):
+        """ Returns the properties of n tasks. Drawing the properties one by one is slow for some child classes,
+            which then overwrite this method to draw the properties of all n tasks at once.
+        """
+        return [self.create_properties(random) for _ in range(n)]
+
+    @staticmethod
+    def beta_samples(random, beta_parameters, n):
+        """ Returns n rows with one sample for each (a, b) pair in beta_parameters """
+        return np.stack([random.beta(a, b, size=n) for a, b in beta_parameters], axis=1).tolist()
+
     @staticmethod
     def save_list(list, config):
         """ Store a list of TaskPropertiesDistribution objects both in human-readable and
@@ -35,7 +42,7 @@ class TaskPropertiesDistribution:
                 out_file.write(str(item))
                 out_file.write("\n")
         with open(config.path("task_properties_distributions.pickle"), "wb") as out_file:
-            pickle.dump(list, out_file)
+            pickle.dump(list, out_file, protocol=pickle.HIGHEST_PROTOCOL)
 
     @staticmethod
     def load_list(config):
@@ -50,10 +57,20 @@ class TaskPropertiesDistribution:
 
 class TaskPropertiesBetaDistribution(TaskPropertiesDistribution):
 
+    DRAWS_IN_BULK = True
+
+    BETA_PARAMETERS = ((10, 10), (40, 10), (10, 10), (10, 10), (10, 10))
+
     def create_properties(self, random):
         return TaskProperties(payout=random.beta(10, 10), expertise=random.beta(40, 10), effort=random.beta(10, 10),
                               interestingness=random.beta(10, 10)-0.5, target_num_instances=random.beta(10, 10)*100)
 
+    def create_properties_list(self, random, n):
+        return [TaskProperties(payout=payout, expertise=expertise, effort=effort,
+                               interestingness=interestingness-0.5, target_num_instances=target_num_instances*100)
+                for payout, expertise, effort, interestingness, target_num_instances
+                in self.beta_samples(random, TaskPropertiesBetaDistribution.BETA_PARAMETERS, n)]
+
 
 class TaskPropertiesCustomDistribution(TaskPropertiesDistribution):
     def __str__(self):
@@ -66,6 +83,8 @@ class TaskPropertiesCustomBetaDistribution(TaskPropertiesDistribution):
     TODO: refactor to have TaskPropertiesCustomDistribution as parent class
     """
 
+    DRAWS_IN_BULK = True
+
     def __init__(self, payout=(10, 10), expertise=(40, 10), effort=(10, 10), interestingness=(10, 10),
                  target_num_instances=(10, 10), target_num_instances_scale=100):
         """
@@ -89,6 +108,13 @@ class TaskPropertiesCustomBetaDistribution(TaskPropertiesDistribution):
                               effort=random.beta(*self.effort), interestingness=random.beta(*self.interestingness)-0.5,
                               target_num_instances=random.beta(*self.target_num_instances)*self.target_num_instances_scale)
 
+    def create_properties_list(self, random, n):
+        beta_parameters = (self.payout, self.expertise, self.effort, self.interestingness, self.target_num_instances)
+        return [TaskProperties(payout=payout, expertise=expertise, effort=effort, interestingness=interestingness-0.5,
+                               target_num_instances=target_num_instances*self.target_num_instances_scale)
+                for payout, expertise, effort, interestingness, target_num_instances
+                in self.beta_samples(random, beta_parameters, n)]
+
     def __str__(self):
         return self.__class__.__name__ + "(" + ";".join([f"{k}:{v}" for k, v in vars(self).items()]) + ")"
 
@@ -119,11 +145,54 @@ class TaskPropertiesCustomFixedDistribution(TaskPropertiesCustomDistribution):
                               target_num_instances=self.target_num_instances)
 
 
+class TaskPropertiesQueue:
+    """
+    The properties of the tasks for the next episodes of an environment, one TaskProperties object per task-giver and
+    episode. Drawing single samples from the random generator is slow, so if all task-givers draw in bulk
+    (DRAWS_IN_BULK), the properties are drawn for BLOCK_SIZE episodes at once. The drawn properties are discarded if
+    the list of task-givers or the attributes of a task-giver change, and with clear() (e.g. when re-seeding).
+    """
+
+    # number of episodes for which the task properties are drawn at once
+    BLOCK_SIZE = 256
+
+    def __init__(self):
+        self.block = []
+        self.idx = 0
+        # task-givers and their attributes the block was drawn with
+        self.block_task_givers = None
+
+    def clear(self):
+        self.block = []
+        self.idx = 0
+        self.block_task_givers = None
+
+    def next(self, tasks_properties_distributions, random):
+        """
+        Returns the properties of the tasks of one episode, one per task-giver
+        """
+        task_givers = [(task_properties_distribution, vars(task_properties_distribution).copy())
+                       for task_properties_distribution in tasks_properties_distributions]
+        if self.idx == len(self.block) or task_givers != self.block_task_givers:
+            bulk = all(task_properties_distribution.DRAWS_IN_BULK
+                       for task_properties_distribution in tasks_properties_distributions)
+            n = TaskPropertiesQueue.BLOCK_SIZE if bulk else 1
+            self.block = list(zip(*[task_properties_distribution.create_properties_list(random, n)
+                                    for task_properties_distribution in tasks_properties_distributions]))
+            self.idx = 0
+            self.block_task_givers = task_givers
+        task_props = self.block[self.idx]
+        self.idx += 1
+        return task_props
+
+
 class TaskProperties:
     """
     The properties of a task. The actual code for the task is all grouped in the Task class.
     """
 
+    __slots__ = ("payout", "expertise", "effort", "interestingness", "target_num_instances", "num_classes")
+
     def __init__(self, payout: float, expertise: float, effort: float, interestingness: float, target_num_instances: int):
         self.payout: float = payout
         self.expertise: float = expertise
@@ -139,6 +208,8 @@ class AntiCheatSettings:
     system.
     """
 
+    __slots__ = ("qa_false_max", "qa_mode_prob", "reputation_punishment", "reputation_bonus", "min_reputation")
+
     def __init__(self, qa_false_max: int, qa_mode_prob: float, reputation_punishment: float, reputation_bonus: float, min_reputation: float):
         """
         :param qa_false_max: maximum number of hidden, known-answer gold questions the worker can answer incorrectly
@@ -157,86 +228,31 @@ class AntiCheatSettings:
         self.min_reputation: float = min_reputation
 
     def save(self, config):
-        with open(config.path("anti_cheat_settings.json"), "w") as out_file:
-            json.dump(self.__dict__, out_file, indent=4, sort_keys=True)
+        save_json({key: getattr(self, key) for key in self.__slots__}, config.path("anti_cheat_settings.json"))
 
     @staticmethod
     def load(config):
         path = config.path("anti_cheat_settings.json")
-        props_json = json.load(open(path, "r"))
+        props_json = load_json(path)
         props = AntiCheatSettings(-1, -1, -1, -1, -1)
-        props.__dict__ = {}
         for key, value in props_json.items():
-            props.__dict__[key] = value
+            setattr(props, key, value)
         return props
 
 
 class Task:
     """
-    A task
+    A task in an episode, given by its properties and the anti-cheat settings of its task-giver. The state of the
+    tasks during an episode (current question, counters) is kept in the arrays of UserModelEnv and
+    BatchedUserModelEnv, the rules of the tasks are implemented in their step functions (see envcheck.py for a
+    plain Python reference of the rules).
     """
 
     QUALITY_CONTROL_MODE = 0 # hidden gold question mode
     LABEL_MODE = 1 # actual labeling (unknown answer) mode
 
+    __slots__ = ("properties", "anti_cheat_settings")
+
     def __init__(self, properties: TaskProperties, anti_cheat_settings: AntiCheatSettings):
         self.properties: TaskProperties = properties
         self.anti_cheat_settings: AntiCheatSettings = anti_cheat_settings
-
-        self.mode: Optional[int] = None # whether the last question was a hidden gold question or a normal question
-        self.current_instance: Optional[Instance] = None
-
-        self.instance_counter: int = 0 # how many rounds of labeling the user has done
-        self.real_instance_counter: int = 0 # without the QA instances
-        self.qa_false_counter: int = 0 # how many qa instances answered incorrectly
-
-        self.last_response_type = "not-set" # logging what type the last response was (correct, failed qa, etc.)
-
-    def receive_answer(self, answer):
-        assert self.mode is not None
-
-        self.instance_counter += 1
-        reputation_change = 0
-
-        if self.mode == Task.QUALITY_CONTROL_MODE:
-            if answer != self.current_instance.true_label:
-                self.qa_false_counter += 1
-                reputation_change = self.anti_cheat_settings.reputation_punishment
-                self.last_response_type = "qa_incorrect"
-            else:
-                reputation_change = self.anti_cheat_settings.reputation_bonus
-                self.last_response_type = "qa_correct"
-
-        elif self.mode == Task.LABEL_MODE:
-            self.real_instance_counter += 1
-            if answer != self.current_instance.true_label:
-                self.last_response_type = "incorrect"
-            else:
-                self.last_response_type = "correct"
-
-        return reputation_change
-
-    def give_new_instance(self, random: np.random.Generator) -> (Optional[Instance], str):
-        if random.random() < self.anti_cheat_settings.qa_mode_prob:
-            self.mode = Task.QUALITY_CONTROL_MODE
-            self.current_instance = self.get_next_known_answer_instance(random)
-        else:
-            self.mode = Task.LABEL_MODE
-            self.current_instance = self.get_next_unlabeled_instance(random)
-
-    def get_next_unlabeled_instance(self, random: np.random.Generator):
-        return self.get_next_known_answer_instance(random)
-
-    def get_next_known_answer_instance(self, random: np.random.Generator):
-        return Instance(true_label=random.integers(0, self.properties.num_classes))
-
-    def is_active(self, current_user_reputation):
-        return self.real_instance_counter < self.properties.target_num_instances and \
-               self.qa_false_counter < self.anti_cheat_settings.qa_false_max and \
-               current_user_reputation >= self.anti_cheat_settings.min_reputation
-
-    def __str__(self):
-        output = "TaskProvider ("
-        output += f", {self.instance_counter} instances labeled with {self.real_instance_counter} real instances and "
-        output += f"{self.qa_false_counter} QA answers failed)"
-        return output
@@ -1,10 +1,13 @@
-import json
+from util.exputil import save_json, load_json
 
 
 class UserProperties:
     """ The properties of the worker/user
     """
 
+    __slots__ = ("interestingness_sensitivity", "payout_sensitivity", "time_sensitivity", "time_budget",
+                 "start_reputation", "random_answer_time", "intentional_answer_time", "switch_task_time")
+
     def __init__(self, interestingness_sensitivity, payout_sensitivity, time_sensitivity, time_budget, start_reputation,
                  switch_task_time=1):
         """
@@ -32,15 +35,13 @@ class UserProperties:
         self.switch_task_time = switch_task_time
 
     def save(self, config):
-        with open(config.path("user_properties.json"), "w") as out_file:
-            json.dump(self.__dict__, out_file, indent=4, sort_keys=True)
+        save_json({key: getattr(self, key) for key in self.__slots__}, config.path("user_properties.json"))
 
     @staticmethod
     def load(config):
         path = config.path("user_properties.json")
-        props_json = json.load(open(path, "r"))
+        props_json = load_json(path)
         props = UserProperties(-1, -1, -1, -1, -1)
-        props.__dict__ = {}
         for key, value in props_json.items():
-            props.__dict__[key] = value
+            setattr(props, key, value)
         return props
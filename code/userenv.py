@@ -1,11 +1,12 @@
 from typing import Optional, List
 
 import numpy as np
-import gym
-from gym import spaces
+import gymnasium as gym
+from gymnasium import spaces
+from numba import njit
 
 from user import UserProperties
-from task import Instance, Task, TaskPropertiesDistribution, AntiCheatSettings
+from task import Task, TaskPropertiesDistribution, TaskPropertiesQueue, AntiCheatSettings
 from util.exputil import Config
 
 
@@ -20,42 +21,37 @@ class UserModelEnv(gym.Env):
     ACTION_ANS_INTENT = 2  # answer diligently
     SWITCH_TASK0 = 3
 
+    # names of the actions (see action_to_str()), precomputed for up to MAX_NAMED_TASKS tasks
+    MAX_NAMED_TASKS = 64
+    ACTION_NAMES = ("QUIT", "ANSWER NEGLIGENTLY", "ANSWER DILIGENTLY") + \
+        tuple(f"SWITCH TO TASK {i}" for i in range(MAX_NAMED_TASKS))
+
     # metadata for RL gym
-    metadata = {'render.modes': ["text"]}
+    metadata = {'render_modes': ["text"]}
+
+    # number of steps for which the random values are drawn at once
+    RANDOM_VALUES_BLOCK_SIZE = 4096
 
     def __init__(self, config: Config, user_properties: UserProperties,
                  tasks_properties_distributions: List[TaskPropertiesDistribution],
-                 anti_cheat_settings: AntiCheatSettings):
+                 anti_cheat_settings: AntiCheatSettings, render_mode: Optional[str] = None):
         """
         :param config: experimental configuration
         :param user_properties: properties of the worker
         :param tasks_properties_distributions: list of task-givers, decide/generate the properties of the tasks,
                 one for each task in each episode
         :param anti_cheat_settings: settings to deter cheating
+        :param render_mode: "text" to print the observation in render(), None to not render
         """
         super().__init__()
 
         self.config: Config = config
+        self.render_mode: Optional[str] = render_mode
 
         self.num_tasks: int = len(tasks_properties_distributions)
 
-        # seven possible actions (quit, answer randomly, answer intentionally, switch to task i)
         self.num_actions = 3 + self.num_tasks
-        self.action_space = spaces.Discrete(self.num_actions)
-
-        # observations of the user:
-        # for each of the four tasks:
-        #   payout,
-        #   how many rounds of labeling already done (-1 is task is not active),
-        #   expertise, effort, interestingness (-1 if task not yet started)
-        # current task idx, user reputation [0,1], user time budget, overall time spent
-        min_values = [0, -1, -1, -1, -1] * self.num_tasks
-        min_values.extend([-1, 0, 0, 0])
-        max_values = [ 1, float("inf"), float("inf"), float("inf"), float("inf")] * self.num_tasks
-        max_values.extend([self.num_tasks, 1, float("inf"), float("inf")])
-        self.observation_space = spaces.Box(low=np.float32(min_values),
-                                            high=np.float32(max_values),
-                                            shape=(len(min_values),))
+        self.action_space, self.observation_space = UserModelEnv.create_spaces(self.num_tasks)
 
         self.user_properties: UserProperties = user_properties
         self.user_reputation = -1
@@ -69,12 +65,65 @@ class UserModelEnv(gym.Env):
         # to each task
         self.task_task_dist_map = {}
 
+        # properties and state of the tasks as parallel arrays (one entry per task), used by _step_core and
+        # create_observation(). The Task objects in self.tasks only hold the properties of the tasks.
+        self.task_payout = np.zeros(self.num_tasks, dtype=np.float64)
+        self.task_expertise = np.zeros(self.num_tasks, dtype=np.float64)
+        self.task_effort = np.zeros(self.num_tasks, dtype=np.float64)
+        self.task_interestingness = np.zeros(self.num_tasks, dtype=np.float64)
+        self.task_target_num_instances = np.zeros(self.num_tasks, dtype=np.float64)
+        self.task_num_classes = np.ones(self.num_tasks, dtype=np.int64)
+        self.task_mode = np.full(self.num_tasks, Task.LABEL_MODE, dtype=np.int64)
+        self.task_true_label = np.zeros(self.num_tasks, dtype=np.int64) # true label of the current question
+        self.task_instance_counter = np.zeros(self.num_tasks, dtype=np.int64)
+        self.task_real_instance_counter = np.zeros(self.num_tasks, dtype=np.int64)
+        self.task_qa_false_counter = np.zeros(self.num_tasks, dtype=np.int64)
+        # whether each task is still active (see envcheck.is_task_active()), kept up to date by _step_core so that
+        # it is only recomputed when the state of a task or the user reputation changes
+        self.task_active = np.zeros(self.num_tasks, dtype=np.bool_)
+        # create_observation() writes into this buffer instead of allocating a new array in each step.
+        # gymnasium's Box.contains() rejects observations with a different dtype than the observation space.
+        self.observation_buffer = np.empty(self.num_tasks * 5 + 4, dtype=np.float32)
+        # the arguments of _step_core and _create_observation_core that stay the same during an episode (task arrays,
+        # user properties and anti-cheat settings), bound once in reset() instead of being collected in each step
+        self.step_arguments = ()
+        self.observation_arguments = ()
+
         self.last_action = None
-        self.current_instance: Optional[Instance] = None
         self.current_task_idx: int = -1 # last task that was selected by agent
         self.overall_time_spent: float = 0
 
         self.random = None
+        # random values for the next steps, see next_random_values()
+        self.random_values = np.empty((0, 4))
+        self.random_values_idx = 0
+        # properties of the tasks for the next episodes, drawn in advance from the task-givers
+        self.task_properties_queue = TaskPropertiesQueue()
+
+    @staticmethod
+    def create_spaces(num_tasks):
+        """
+        Create the action and the observation space of the environment for the given number of tasks
+        """
+        # seven possible actions (quit, answer randomly, answer intentionally, switch to task i)
+        action_space = spaces.Discrete(3 + num_tasks)
+
+        # observations of the user:
+        # for each of the four tasks:
+        #   payout,
+        #   how many rounds of labeling already done (-1 is task is not active),
+        #   expertise, effort, interestingness (-1 if task not yet started)
+        # current task idx, user reputation [0,1], user time budget, overall time spent
+        min_values = [0, -1, -1, -1, -1] * num_tasks
+        min_values.extend([-1, 0, 0, 0])
+        max_values = [ 1, float("inf"), float("inf"), float("inf"), float("inf")] * num_tasks
+        max_values.extend([num_tasks, 1, float("inf"), float("inf")])
+        # the observations are created as float32 (see create_observation()), so that neither gymnasium nor
+        # stable-baselines3 need to cast them
+        observation_space = spaces.Box(low=np.float32(min_values),
+                                       high=np.float32(max_values),
+                                       shape=(len(min_values),), dtype=np.float32)
+        return action_space, observation_space
 
     def step(self, action: int):
         """ environment reacts to the user's action in this step function
@@ -83,139 +132,69 @@ class UserModelEnv(gym.Env):
 
         info = {}
 
-        # worker quits -> end of episode
-        if action == UserModelEnv.ACTION_QUIT:
-            done = True
-            reward = (self.user_properties.time_budget - self.overall_time_spent) * self.user_properties.time_sensitivity # reward for using time for something else
-            info["end_reason"] = "user_quit"
-
-            obs = self.create_observation()
-            return obs, reward, done, info
+        reward, end_reason, self.user_reputation, self.overall_time_spent, self.current_task_idx, tasks_changed = \
+            _step_core(int(action), self.user_reputation, self.overall_time_spent, self.current_task_idx,
+                       self.next_random_values(), *self.step_arguments)
 
-        # worker runs out of time -> end of episode
-        if self.overall_time_spent > self.user_properties.time_budget:
-            done = True
-            reward = 0
-            info["end_reason"] = "end_of_user_time_budget"
+        # worker quits or runs out of time -> end of episode
+        terminated = end_reason != 0
+        if terminated:
+            info["end_reason"] = END_REASONS[end_reason]
 
+        # the observation is only created from scratch if the step changed a task. Quitting, invalid actions and
+        # switching tasks only change the values of the worker.
+        if tasks_changed:
             obs = self.create_observation()
-            return obs, reward, done, info
-
-        done = False
-
-        current_task = self.tasks[self.current_task_idx]
-
-        if action == UserModelEnv.ACTION_ANS_RND or action == UserModelEnv.ACTION_ANS_INTENT:
-            # no task selected or task is not active, so answering does not make sense
-            if self.current_task_idx == -1 or not current_task.is_active(self.user_reputation):
-                reward = -1
-                self.overall_time_spent += self.user_properties.random_answer_time
-                obs = self.create_observation()
-                return obs, reward, done, info
-
-            reward_payout = self.user_properties.payout_sensitivity * current_task.properties.payout
-
-            # negligent answer
-            if action == UserModelEnv.ACTION_ANS_RND:
-                time_spent = self.user_properties.random_answer_time
-                answer_to_task = self.random.integers(0, current_task.properties.num_classes)
-                reward = reward_payout  # only monetary reward
-
-            # diligent answer
-            else:
-                assert action == UserModelEnv.ACTION_ANS_INTENT
-                time_spent = self.user_properties.intentional_answer_time * current_task.properties.effort
-                if self.random.random() < current_task.properties.expertise:
-                    answer_to_task = current_task.current_instance.true_label
-                else:
-                    answer_to_task = self.random.integers(0, current_task.properties.num_classes)
-                reward_interestingness = self.user_properties.interestingness_sensitivity * current_task.properties.interestingness
-                reward = reward_payout + reward_interestingness  # monetary + interestingness reward
-
-            self.overall_time_spent += time_spent
-
-            # Behavior of the task and task-giver
-            reputation_change = current_task.receive_answer(answer_to_task)
-            self.user_reputation += reputation_change
-            self.user_reputation = max(0, min(1, self.user_reputation))
-
-            # task-giver bans worker or has run out of questions, no longer supplies user with new questions
-            if not current_task.is_active(self.user_reputation):
-                self.current_task_idx = -1
-            else:
-                current_task.give_new_instance(self.random)
-
-            obs = self.create_observation()
-            return obs, reward, done, info
-
-        # select new task
-        if UserModelEnv.SWITCH_TASK0 <= action:
-            previous_task_idx = self.current_task_idx
-            self.current_task_idx = action - UserModelEnv.SWITCH_TASK0
-
-            self.overall_time_spent += self.user_properties.switch_task_time
-
-            # invalid action, can not select a task that is inactive
-            if not self.tasks[self.current_task_idx].is_active(self.user_reputation):
-                # task is not active
-                reward = -1
-                self.current_task_idx = -1
-                obs = self.create_observation()
-                return obs, reward, done, info
-
-            # we are already in this task, switching does not make sense
-            # might be used in the future by agent to get a new, different question
-            if previous_task_idx == self.current_task_idx:
-                reward = -1
-            else:
-                reward = 0
-
-            self.tasks[self.current_task_idx].give_new_instance(self.random)
-
-            obs = self.create_observation()
-            return obs, reward, done, info
+        else:
+            obs = self.update_observation()
+        # copy, as the caller might keep the observation (e.g. the terminal observation of vectorized environments)
+        obs = obs.copy()
+        # the environment has no time limit besides the user's time budget, which is part of the environment,
+        # so episodes are never truncated
+        return obs, reward, terminated, False, info
+
+    def next_random_values(self):
+        """
+        The four uniform random values used by _step_core in one step. Calling the random generator is slow compared
+        to the rest of the step, so the values are drawn for many steps at once.
+        """
+        if self.random_values_idx == len(self.random_values):
+            self.random_values = self.random.random((UserModelEnv.RANDOM_VALUES_BLOCK_SIZE, 4))
+            self.random_values_idx = 0
+        random_values = self.random_values[self.random_values_idx]
+        self.random_values_idx += 1
+        return random_values
 
     def create_observation(self):
         """
-        the part of the environment visible to the worker
+        the part of the environment visible to the worker. Returns the observation buffer of the environment,
+        which is overwritten by the next call.
         """
-        obs = []
-
-        for i, task in enumerate(self.tasks):
-            # payout for the task
-            obs.append(task.properties.payout)
-            # how many rounds of labeling already done for the tasks or -1 if task is inactive
-            if task.is_active(self.user_reputation):
-                obs.append(task.instance_counter)
-            else:
-                obs.append(-1)
-            # expertise, effort, interestingness (-1 if not at least one instance has been done, i.e. the worker
-            # has tried out the task)
-            if task.instance_counter > 0:
-                obs.append(task.properties.expertise)
-                obs.append(task.properties.effort)
-                obs.append(task.properties.interestingness)
-            else:
-                obs.extend([-1, -1, -1])
-        # current task idx
-        obs.append(self.current_task_idx)
-        # user reputation
-        obs.append(self.user_reputation)
-        # user time budget
-        obs.append(self.user_properties.time_budget)
-        obs.append(self.overall_time_spent)
-        return np.array(obs)
-
-    def reset(self):
+        return _create_observation_core(self.current_task_idx, self.user_reputation, self.overall_time_spent,
+                                        *self.observation_arguments)
+
+    def update_observation(self):
         """
-        Reset environment for a new episode
+        Updates only the values of the worker (current task idx, reputation, overall time spent) in the observation
+        buffer, which holds the last observation. Sufficient after steps that did not change a task.
         """
+        obs = self.observation_buffer
+        obs[-4] = self.current_task_idx
+        obs[-3] = self.user_reputation
+        obs[-1] = self.overall_time_spent
+        return obs
+
+    def reset(self, *, seed: Optional[int] = None, options: Optional[dict] = None):
+        """
+        Reset environment for a new episode. If a seed is given, the environment is seeded first (see seed()).
+        """
+        if seed is not None:
+            self.seed(seed)
+
         self.tasks = []
         self.task_task_dist_map = {}
-        new_tasks = []
-        for task_properties_distribution in self.tasks_properties_distributions:
-            task_props = task_properties_distribution.create_properties(self.random)
-            new_tasks.append(Task(task_props, self.anti_cheat_settings))
+        task_props = self.task_properties_queue.next(self.tasks_properties_distributions, self.random)
+        new_tasks = [Task(props, self.anti_cheat_settings) for props in task_props]
         # shuffle tasks, so that even if the task property distributions are different, it can not learn which is which
         # but store mapping so that we can recover the creating task distribution
         task_dist_indices = list(range(len(self.tasks_properties_distributions)))
@@ -224,16 +203,48 @@ class UserModelEnv(gym.Env):
             self.tasks.append(new_tasks[task_dist_index])
             self.task_task_dist_map[task_index] = task_dist_index
 
+        # the state of the tasks is kept as arrays (see __init__), the Task objects only hold the properties
+        self.task_payout[:] = [task.properties.payout for task in self.tasks]
+        self.task_expertise[:] = [task.properties.expertise for task in self.tasks]
+        self.task_effort[:] = [task.properties.effort for task in self.tasks]
+        self.task_interestingness[:] = [task.properties.interestingness for task in self.tasks]
+        self.task_target_num_instances[:] = [task.properties.target_num_instances for task in self.tasks]
+        self.task_num_classes[:] = [task.properties.num_classes for task in self.tasks]
+        self.task_mode[:] = Task.LABEL_MODE
+        self.task_true_label[:] = 0
+        self.task_instance_counter[:] = 0
+        self.task_real_instance_counter[:] = 0
+        self.task_qa_false_counter[:] = 0
+
+        user_props = self.user_properties
+        anti_cheat = self.anti_cheat_settings
+        self.step_arguments = (self.task_payout, self.task_expertise, self.task_effort, self.task_interestingness,
+                               self.task_target_num_instances, self.task_num_classes, self.task_mode,
+                               self.task_true_label, self.task_instance_counter, self.task_real_instance_counter,
+                               self.task_qa_false_counter, self.task_active,
+                               float(user_props.time_budget), float(user_props.time_sensitivity),
+                               float(user_props.payout_sensitivity), float(user_props.interestingness_sensitivity),
+                               float(user_props.random_answer_time), float(user_props.intentional_answer_time),
+                               float(user_props.switch_task_time),
+                               int(anti_cheat.qa_false_max), float(anti_cheat.qa_mode_prob),
+                               float(anti_cheat.reputation_punishment), float(anti_cheat.reputation_bonus),
+                               float(anti_cheat.min_reputation))
+        self.observation_arguments = (self.observation_buffer, self.task_payout, self.task_expertise,
+                                      self.task_effort, self.task_interestingness, self.task_instance_counter,
+                                      self.task_active, float(user_props.time_budget))
+
         self.current_task_idx = -1
         self.last_action = None
-        self.current_instance= None
-        self.overall_time_spent = 0
-        self.user_reputation = self.user_properties.start_reputation
+        self.overall_time_spent = 0.0
+        self.user_reputation = float(self.user_properties.start_reputation)
+        _update_task_active(self.task_active, self.user_reputation, self.task_target_num_instances,
+                            self.task_real_instance_counter, self.task_qa_false_counter,
+                            int(anti_cheat.qa_false_max), float(anti_cheat.min_reputation))
 
-        return self.create_observation()
+        return self.create_observation().copy(), {}
 
-    def render(self, mode='text', close=False):
-        if mode == "text":
+    def render(self):
+        if self.render_mode == "text":
             print(self.observation_to_string(self.create_observation()))
 
     def observation_to_string(self, obs):
@@ -262,6 +273,9 @@ class UserModelEnv(gym.Env):
         Set the random seed for reproducibility of the environment
         """
         self.random = np.random.default_rng(seed)
+        self.random_values = np.empty((0, 4))
+        self.random_values_idx = 0
+        self.task_properties_queue.clear()
         # not sure if needed, but probably doesn't hurt
         # https://harald.co/2019/07/30/reproducibility-issues-using-openai-gym/
         self.action_space.seed(seed)
@@ -272,11 +286,193 @@ class UserModelEnv(gym.Env):
         Map the action index (numeric int value) to the name representation,
         e.g. 0 to "QUIT" or 1 to "ANSWER NEGLIGENTLY"
         """
-        if action_idx == UserModelEnv.ACTION_QUIT:
-            return "QUIT"
-        if action_idx == UserModelEnv.ACTION_ANS_RND:
-            return "ANSWER NEGLIGENTLY"
-        if action_idx == UserModelEnv.ACTION_ANS_INTENT:
-            return "ANSWER DILIGENTLY"
+        if 0 <= action_idx < len(UserModelEnv.ACTION_NAMES):
+            return UserModelEnv.ACTION_NAMES[action_idx]
         if action_idx >= UserModelEnv.SWITCH_TASK0:
             return f"SWITCH TO TASK {action_idx - UserModelEnv.SWITCH_TASK0}"
+
+
+# numba compiles global values as constants, so the constants of the classes are copied to module level
+ACTION_QUIT = UserModelEnv.ACTION_QUIT
+ACTION_ANS_RND = UserModelEnv.ACTION_ANS_RND
+ACTION_ANS_INTENT = UserModelEnv.ACTION_ANS_INTENT
+SWITCH_TASK0 = UserModelEnv.SWITCH_TASK0
+QUALITY_CONTROL_MODE = Task.QUALITY_CONTROL_MODE
+LABEL_MODE = Task.LABEL_MODE
+
+# end reasons of an episode as returned by _step_core (0 = episode continues)
+END_REASONS = (None, "user_quit", "end_of_user_time_budget")
+
+
+@njit(cache=True)
+def _update_task_active(task_active, user_reputation, task_target_num_instances, task_real_instance_counter,
+                        task_qa_false_counter, qa_false_max, min_reputation):
+    """ Same as envcheck.is_task_active() for all tasks of UserModelEnv, the result is written into task_active """
+    # without short-circuiting, so that the loop has no branches and can be vectorized
+    reputation_ok = user_reputation >= min_reputation
+    for i in range(task_active.shape[0]):
+        task_active[i] = (task_real_instance_counter[i] < task_target_num_instances[i]) & \
+                         (task_qa_false_counter[i] < qa_false_max) & reputation_ok
+
+
+@njit(cache=True)
+def _step_core(action, user_reputation, overall_time_spent, current_task_idx, random_values,
+               task_payout, task_expertise, task_effort, task_interestingness, task_target_num_instances,
+               task_num_classes, task_mode, task_true_label, task_instance_counter, task_real_instance_counter,
+               task_qa_false_counter, task_active,
+               time_budget, time_sensitivity, payout_sensitivity, interestingness_sensitivity,
+               random_answer_time, intentional_answer_time, switch_task_time,
+               qa_false_max, qa_mode_prob, reputation_punishment, reputation_bonus, min_reputation):
+    """
+    Numeric core of UserModelEnv.step(), compiled with numba. The task arrays are changed in-place, task_active
+    is only recomputed if the step changed the counters of a task or the reputation.
+    random_values are four uniform samples from [0,1) (answer known with expertise, negligent answer, hidden gold
+    question, true label of the new question), drawn by the caller.
+    Returns reward, end reason (index into END_REASONS), user reputation, overall time spent, current task idx and
+    whether the step changed the observed values of any task (only answering a question does).
+    """
+    # worker quits -> end of episode
+    if action == ACTION_QUIT:
+        reward = (time_budget - overall_time_spent) * time_sensitivity # reward for using time for something else
+        return reward, 1, user_reputation, overall_time_spent, current_task_idx, False
+
+    # worker runs out of time -> end of episode
+    if overall_time_spent > time_budget:
+        return 0.0, 2, user_reputation, overall_time_spent, current_task_idx, False
+
+    new_instance_task_idx = -1
+    tasks_changed = False
+
+    if action == ACTION_ANS_RND or action == ACTION_ANS_INTENT:
+        # no task selected or task is not active, so answering does not make sense
+        if current_task_idx == -1 or not task_active[current_task_idx]:
+            return -1.0, 0, user_reputation, overall_time_spent + random_answer_time, current_task_idx, False
+
+        num_classes = task_num_classes[current_task_idx]
+        random_answer = min(int(random_values[1] * num_classes), num_classes - 1)
+        reward_payout = payout_sensitivity * task_payout[current_task_idx]
+
+        # negligent answer
+        if action == ACTION_ANS_RND:
+            time_spent = random_answer_time
+            answer_to_task = random_answer
+            reward = reward_payout  # only monetary reward
+
+        # diligent answer
+        else:
+            time_spent = intentional_answer_time * task_effort[current_task_idx]
+            if random_values[0] < task_expertise[current_task_idx]:
+                answer_to_task = task_true_label[current_task_idx]
+            else:
+                answer_to_task = random_answer
+            reward_interestingness = interestingness_sensitivity * task_interestingness[current_task_idx]
+            reward = reward_payout + reward_interestingness  # monetary + interestingness reward
+
+        overall_time_spent += time_spent
+
+        # Behavior of the task and task-giver
+        tasks_changed = True
+        task_instance_counter[current_task_idx] += 1
+        if task_mode[current_task_idx] == QUALITY_CONTROL_MODE:
+            if answer_to_task != task_true_label[current_task_idx]:
+                task_qa_false_counter[current_task_idx] += 1
+                user_reputation += reputation_punishment
+            else:
+                user_reputation += reputation_bonus
+        else:
+            task_real_instance_counter[current_task_idx] += 1
+        user_reputation = max(0.0, min(1.0, user_reputation))
+
+        # task-giver bans worker or has run out of questions, no longer supplies user with new questions
+        _update_task_active(task_active, user_reputation, task_target_num_instances, task_real_instance_counter,
+                            task_qa_false_counter, qa_false_max, min_reputation)
+        if not task_active[current_task_idx]:
+            current_task_idx = -1
+        else:
+            new_instance_task_idx = current_task_idx
+
+    # select new task
+    else:
+        previous_task_idx = current_task_idx
+        current_task_idx = action - SWITCH_TASK0
+
+        overall_time_spent += switch_task_time
+
+        # invalid action, can not select a task that is inactive
+        if not task_active[current_task_idx]:
+            return -1.0, 0, user_reputation, overall_time_spent, -1, False
+
+        # we are already in this task, switching does not make sense
+        # might be used in the future by agent to get a new, different question
+        if previous_task_idx == current_task_idx:
+            reward = -1.0
+        else:
+            reward = 0.0
+        new_instance_task_idx = current_task_idx
+
+    # new question, same as envcheck.give_new_question()
+    if new_instance_task_idx != -1:
+        if random_values[2] < qa_mode_prob:
+            task_mode[new_instance_task_idx] = QUALITY_CONTROL_MODE
+        else:
+            task_mode[new_instance_task_idx] = LABEL_MODE
+        num_classes = task_num_classes[new_instance_task_idx]
+        task_true_label[new_instance_task_idx] = min(int(random_values[3] * num_classes), num_classes - 1)
+
+    return reward, 0, user_reputation, overall_time_spent, current_task_idx, tasks_changed
+
+
+@njit(cache=True)
+def _create_observation_core(current_task_idx, user_reputation, overall_time_spent, obs, task_payout,
+                             task_expertise, task_effort, task_interestingness, task_instance_counter, task_active,
+                             time_budget):
+    """
+    Writes the observation of UserModelEnv into obs, compiled with numba. For the few tasks of the environment,
+    a compiled loop over the task arrays is much faster than numpy's vectorized operations on small arrays.
+    """
+    num_tasks = task_payout.shape[0]
+    for i in range(num_tasks):
+        skip_idx = i * 5
+        # payout for the task
+        obs[skip_idx] = task_payout[i]
+        # how many rounds of labeling already done for the tasks or -1 if task is inactive
+        if task_active[i]:
+            obs[skip_idx+1] = task_instance_counter[i]
+        else:
+            obs[skip_idx+1] = -1
+        # expertise, effort, interestingness (-1 if not at least one instance has been done, i.e. the worker
+        # has tried out the task)
+        if task_instance_counter[i] > 0:
+            obs[skip_idx+2] = task_expertise[i]
+            obs[skip_idx+3] = task_effort[i]
+            obs[skip_idx+4] = task_interestingness[i]
+        else:
+            obs[skip_idx+2] = -1
+            obs[skip_idx+3] = -1
+            obs[skip_idx+4] = -1
+    obs_idx = num_tasks * 5
+    # current task idx
+    obs[obs_idx] = current_task_idx
+    # user reputation
+    obs[obs_idx+1] = user_reputation
+    # user time budget
+    obs[obs_idx+2] = time_budget
+    obs[obs_idx+3] = overall_time_spent
+    return obs
+
+
+def _compile_cores():
+    """ Compile the numba functions of UserModelEnv (or load them from numba's cache) with the argument types
+        used by UserModelEnv, so that the first step of an episode is not delayed by the compilation
+    """
+    floats = np.zeros(1, dtype=np.float64)
+    ints = np.zeros(1, dtype=np.int64)
+    bools = np.zeros(1, dtype=np.bool_)
+    _step_core(ACTION_QUIT, 1.0, 0.0, -1, np.zeros(4, dtype=np.float64), floats, floats, floats, floats, floats,
+               ints, ints, ints, ints, ints, ints, bools, 1.0, 0.0, 1.0, 1.0, 0.1, 1.0, 1.0, 1, 0.0, 0.0, 0.0, 0.0)
+    _update_task_active(bools, 1.0, floats, ints, ints, 1, 0.0)
+    _create_observation_core(-1, 1.0, 0.0, np.zeros(5 + 4, dtype=np.float32), floats, floats, floats, floats, ints,
+                             bools, 1.0)
+
+
+_compile_cores()
@@ -5,11 +5,63 @@ import os
 import time
 import subprocess
 
+import numpy as np
+
+try:
+    import orjson
+except ImportError: # orjson is optional, the json module of the standard library is used without it
+    orjson = None
+
+
+def _json_default(obj):
+    """ Converts the numpy values that json can not serialize, the same for orjson and the json module
+    """
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def save_json(obj, path):
+    """ Store obj in a human-readable, UTF-8 encoded json file. Uses orjson if it is installed, as it is faster.
+        Both write the same data, but the files can differ in the formatting (e.g. orjson writes 1e-05 as 0.00001).
+    """
+    if orjson is not None:
+        with open(path, "wb") as out_file:
+            out_file.write(orjson.dumps(obj, default=_json_default, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
+    else:
+        with open(path, "w", encoding="utf-8") as out_file:
+            json.dump(obj, out_file, indent=2, sort_keys=True, ensure_ascii=False, default=_json_default)
+
+
+def load_json(path):
+    """ Load a json file, with orjson if it is installed
+    """
+    if orjson is not None:
+        with open(path, "rb") as in_file:
+            return orjson.loads(in_file.read())
+    with open(path, "r", encoding="utf-8") as in_file:
+        return json.load(in_file)
+
 
 class Config(argparse.Namespace):
     """ A configuration file that stores the settings of an experiment. Can be stored and loaded.
     """
 
+    # settings that were added after the first experiments, with the values that were used before they existed.
+    # Used for configs stored without them, so that such experiments can still be loaded and trained again
+    # in the same way.
+    LEGACY_DEFAULTS = {
+        "num_envs": 1,
+        "batched_env": False,
+        "check_env": False,
+        "batch_size": 32, # default of stable-baselines3's DQN and sb3-contrib's QR-DQN
+        "train_freq": 4,
+        "gradient_steps": 1,
+        "buffer_size": 1000000,
+    }
+
     def __init__(self):
         super().__init__()
 
@@ -32,6 +84,19 @@ class Config(argparse.Namespace):
         self.exp_dir_path = os.path.join("..", "exp", self.name)
         os.makedirs(self.exp_dir_path, exist_ok=exist_ok)
 
+        # number of environments that collect experience in parallel during training
+        self.num_envs = 1
+        # use BatchedUserModelEnv, which steps all environments together with vector operations
+        self.batched_env = False
+        # run stable-baselines3's environment checker before the training (only needed when changing the environment)
+        self.check_env = False
+
+        # settings of the learner of the (QR-)DQN model
+        self.batch_size = 256
+        self.train_freq = 4 # update the model every train_freq steps (of all num_envs environments together)
+        self.gradient_steps = 1 # gradient steps per update and environment, i.e. scaled by num_envs
+        self.buffer_size = 1000000 # size of the replay buffer
+
     def path(self, filename):
         return os.path.join("..", "exp", self.name, filename)
 
@@ -39,8 +104,7 @@ class Config(argparse.Namespace):
         path = os.path.join(self.exp_dir_path, "config.json")
         config_dict = vars(self)
         print(config_dict)
-        with open(path, "w") as out_file:
-            json.dump(config_dict, out_file, indent=4, sort_keys=True)
+        save_json(config_dict, path)
 
     def copy_exp_dir(self, new_name):
         """ copy content of an exp dir to a new directory and returns a new config file.
@@ -69,9 +133,11 @@ class Config(argparse.Namespace):
     @staticmethod
     def load(name):
         path = os.path.join("..", "exp", name, "config.json")
-        config_json = json.load(open(path, "r"))
+        config_json = load_json(path)
         config = Config()
         config.__dict__ = {}
+        for key, value in Config.LEGACY_DEFAULTS.items():
+            config.__dict__[key] = value
         for key, value in config_json.items():
             config.__dict__[key] = value
         return config